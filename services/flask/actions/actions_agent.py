@@ -1,6 +1,6 @@
 from typing import Dict, List, Any, Tuple
 
-import torch
+from transformers import StoppingCriteriaList
 
 from services.flask.agent import Agent
 
@@ -49,16 +49,17 @@ Investing in an ETF may support steady, long-term capital growth, while market f
         """Add a message to the conversation history."""
         self.conversation_history[action_name].append({"role": role, "content": content})
 
-    def process_question(self, action_name: str, user_question: str) -> Tuple[str, Dict[str, List[str]]]:
+    def generate_response(self, action_name: str, user_question: str, stopping_criteria: StoppingCriteriaList = None) -> str:
         """
-        Process a user question, generate a response, and check if any
-        hidden information has been discovered.
+        Generate a response to a user question about an action.
 
         Args:
+            action_name: The action the question is about
             user_question: The user's question
+            stopping_criteria: Optional criteria forwarded to the model's generate call
 
         Returns:
-            Tuple containing (agent_response, discovered_info)
+            The agent's response. Generation errors are raised to the caller.
         """
         if action_name not in (self.conversation_history.keys()) or len(self.conversation_history[action_name]):
             self.conversation_history[action_name] = []
@@ -78,32 +79,29 @@ Investing in an ETF may support steady, long-term capital growth, while market f
             # Keep the system message and the last 9 messages
             messages = [messages[0]] + messages[-9:]
 
+        # Use more conservative generation settings
+        return self.agent.generate(
+            messages,
+            max_new_tokens=256,  # Reduced from 512 to save memory
+            temperature=0.7,
+            top_p=0.9,
+            do_sample=True,
+            stopping_criteria=stopping_criteria,
+        )
+
+    def process_question(self, action_name: str, user_question: str) -> Tuple[str, Dict[str, List[str]]]:
+        """
+        Process a user question, generate a response, and check if any
+        hidden information has been discovered.
+
+        Args:
+            user_question: The user's question
+
+        Returns:
+            Tuple containing (agent_response, discovered_info)
+        """
         try:
-            inputs = self.agent.tokenizer.apply_chat_template(
-                messages,
-                add_generation_prompt=True,
-                return_tensors="pt"
-            )
-
-            # Move inputs to the appropriate device
-            if hasattr(self.agent.model, 'device'):
-                inputs = inputs.to(self.agent.model.device)
-            else:
-                # If model is distributed across devices, use the first parameter's device
-                first_param = next(self.agent.model.parameters())
-                inputs = inputs.to(first_param.device)
-
-            with torch.no_grad():
-                # Use more conservative generation settings
-                outputs = self.agent.model.generate(
-                    inputs,
-                    max_new_tokens=256,  # Reduced from 512 to save memory
-                    temperature=0.7,
-                    top_p=0.9,
-                    do_sample=True,
-                )
-
-            response = self.agent.tokenizer.decode(outputs[0][inputs.shape[1]:], skip_special_tokens=True)
+            response = self.generate_response(action_name, user_question)
 
         except Exception as e:
             print(f"Error during generation: {e}")
@@ -114,6 +112,13 @@ Investing in an ETF may support steady, long-term capital growth, while market f
 
         return response
 
+    def action_names(self) -> List[str]:
+        """Names of the available actions, whether given as a mapping or as a list of action objects."""
+        if isinstance(self.actions, dict):
+            return list(self.actions.keys())
+
+        return [action["name"] for action in self.actions if isinstance(action, dict) and action.get("name")]
+
 
 if __name__ == "__main__":
     ACTIONS = {
@@ -1 +1,2 @@
-from .agent import Agent
\ No newline at end of file
+from .agent import Agent
+from .prefetcher import Prefetcher
\ No newline at end of file
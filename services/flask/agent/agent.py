@@ -1,15 +1,19 @@
 import datetime
 import json
+import time
 from typing import Dict, List, Any, Tuple
 
 import torch
 from transformers import AutoModelForCausalLM, AutoTokenizer, BitsAndBytesConfig
 
 class Agent:
-    def __init__(self):
+    def __init__(self, model_id: str = "mistralai/Mistral-7B-Instruct-v0.3"):
         print("Loading model... This may take a few minutes.")
         # Load model with more aggressive memory optimization for 8GB VRAM
-        self.model_id = "mistralai/Mistral-7B-Instruct-v0.3"
+        self.model_id = model_id
+
+        # Optional traces.TraceRecorder that is told about every generation
+        self.recorder = None
 
         # Configure quantization settings
         quantization_config = BitsAndBytesConfig(
@@ -46,4 +50,58 @@ class Agent:
                 print("Model loaded with fallback settings!")
             except Exception as e2:
                 print(f"Error loading model with fallback settings: {e2}")
-                raise RuntimeError("Could not load model with available resources")
\ No newline at end of file
+                raise RuntimeError("Could not load model with available resources")
+
+    def input_device(self) -> torch.device:
+        """Device that prompt tensors need to be moved to before generation."""
+        if hasattr(self.model, 'device'):
+            return self.model.device
+
+        # If model is distributed across devices, use the first parameter's device
+        return next(self.model.parameters()).device
+
+    def generate(self, messages: List[Dict[str, str]], **generate_kwargs) -> str:
+        """
+        Render a chat conversation, generate a reply and decode it.
+
+        Args:
+            messages: Chat messages to apply the tokenizer's chat template to
+            generate_kwargs: Generation settings forwarded to the model's generate call
+
+        Returns:
+            The decoded reply, without the prompt
+        """
+        started = time.perf_counter()
+
+        inputs = self.tokenizer.apply_chat_template(
+            messages,
+            add_generation_prompt=True,
+            return_tensors="pt"
+        )
+        inputs = inputs.to(self.input_device())
+
+        templated = time.perf_counter()
+
+        with torch.no_grad():
+            outputs = self.model.generate(inputs, **generate_kwargs)
+
+        generated = time.perf_counter()
+
+        response = self.tokenizer.decode(outputs[0][inputs.shape[1]:], skip_special_tokens=True)
+
+        decoded = time.perf_counter()
+
+        if self.recorder:
+            self.recorder.record_generation(
+                messages,
+                generate_kwargs,
+                input_tokens=inputs.shape[1],
+                output_tokens=outputs.shape[1] - inputs.shape[1],
+                timings={
+                    "template_ms": (templated - started) * 1000,
+                    "generate_ms": (generated - templated) * 1000,
+                    "decode_ms": (decoded - generated) * 1000,
+                },
+            )
+
+        return response
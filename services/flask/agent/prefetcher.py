@@ -0,0 +1,165 @@
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Dict, Hashable
+
+import torch
+from transformers import StoppingCriteria, StoppingCriteriaList
+
+
+class _YieldToInteractive(StoppingCriteria):
+    """Stops a background generation as soon as an interactive request is waiting."""
+
+    def __init__(self, prefetcher: "Prefetcher"):
+        self.prefetcher = prefetcher
+        self.triggered = False
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        waiting = self.prefetcher.interactive_waiting > 0
+        self.triggered = self.triggered or waiting
+        return torch.full((input_ids.shape[0],), waiting, dtype=torch.bool, device=input_ids.device)
+
+
+class Prefetcher:
+    """
+    Speculatively runs low-priority generations while the model is idle and caches
+    their results.
+
+    Interactive requests wrap their model usage in `interactive()`. While one is waiting
+    or running, no background job starts, and a background generation already in flight
+    is stopped at the next decoding step and requeued.
+    """
+
+    def __init__(self, trace_route: str = "prefetch"):
+        self.cache: Dict[Hashable, Any] = {}
+
+        # Pending jobs, in scheduling order
+        self.jobs: "OrderedDict[Hashable, Callable[[StoppingCriteriaList], Any]]" = OrderedDict()
+
+        # Job the worker has popped but not finished. Cleared to tell the worker to drop it
+        self.in_flight = None
+
+        self.interactive_waiting = 0
+
+        # Serializes all use of the model between request threads and the background worker
+        self.model_lock = threading.Lock()
+        self.condition = threading.Condition()
+
+        # Optional traces.TraceRecorder. Only generations whose result is kept are recorded,
+        # each as a request to `trace_route`
+        self.recorder = None
+        self.trace_route = trace_route
+
+        self.yield_criterion = _YieldToInteractive(self)
+        self.stopping_criteria = StoppingCriteriaList([self.yield_criterion])
+        self.worker = None
+
+    def schedule(self, key: Hashable, job: Callable[[StoppingCriteriaList], Any]) -> None:
+        """
+        Queue a job whose result will be cached under `key`.
+
+        Args:
+            key: Cache key for the job's result
+            job: Callable receiving the stopping criteria it must pass to `generate`
+        """
+        with self.condition:
+            if key in self.cache or key in self.jobs:
+                return
+
+            self.jobs[key] = job
+            self._ensure_worker()
+            self.condition.notify()
+
+    def take(self, key: Hashable) -> Any:
+        """
+        Return and forget the cached result for `key`, so it is only ever served once.
+
+        On a miss, the pending job for `key` is dropped as the caller is about to
+        generate the result itself.
+        """
+        with self.condition:
+            if key in self.cache:
+                return self.cache.pop(key)
+
+            self.jobs.pop(key, None)
+            if self.in_flight == key:
+                self.in_flight = None
+
+            return None
+
+    def cancel(self) -> None:
+        """Drop all pending jobs, including one the worker is about to run. Already cached results are kept."""
+        with self.condition:
+            self.jobs.clear()
+            self.in_flight = None
+
+    @contextmanager
+    def interactive(self):
+        """Take exclusive use of the model, preempting any background generation."""
+        with self.condition:
+            self.interactive_waiting += 1
+
+        try:
+            with self.model_lock:
+                yield
+        finally:
+            with self.condition:
+                self.interactive_waiting -= 1
+                self.condition.notify()
+
+    def _ensure_worker(self) -> None:
+        if self.worker is None or not self.worker.is_alive():
+            self.worker = threading.Thread(target=self._run, name="prefetcher", daemon=True)
+            self.worker.start()
+
+    def _run(self) -> None:
+        while True:
+            with self.condition:
+                while not self.jobs or self.interactive_waiting > 0:
+                    self.condition.wait()
+
+                key, job = self.jobs.popitem(last=False)
+                self.in_flight = key
+
+            with self.model_lock:
+                with self.condition:
+                    # Dropped by take() or cancel() while waiting for the model
+                    if self.in_flight != key:
+                        continue
+
+                self.yield_criterion.triggered = False
+
+                with self.recorder.request(self.trace_route) if self.recorder else nullcontext():
+                    try:
+                        result = job(self.stopping_criteria)
+                    except Exception as e:
+                        print(f"Error during prefetch of {key}: {e}")
+                        self._discard_trace()
+                        with self.condition:
+                            self.in_flight = None
+                        continue
+
+                    preempted = self.yield_criterion.triggered
+
+                    # Decide while still holding the model, so a cancel() from the preempting request
+                    # cannot be undone by requeueing
+                    with self.condition:
+                        if self.in_flight != key:
+                            self._discard_trace()
+                            continue
+
+                        self.in_flight = None
+
+                        if preempted:
+                            # The generation was cut short, so try again once the model is idle.
+                            # Its truncated trace would not reflect real traffic
+                            self._discard_trace()
+                            if key not in self.jobs:
+                                self.jobs[key] = job
+                                self.jobs.move_to_end(key, last=False)
+                        else:
+                            self.cache[key] = result
+
+    def _discard_trace(self) -> None:
+        if self.recorder:
+            self.recorder.discard()
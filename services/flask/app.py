@@ -1,5 +1,6 @@
 import os
 import gc
+from contextlib import nullcontext
 from tempfile import NamedTemporaryFile
 
 import torch
@@ -10,7 +11,8 @@ from werkzeug.utils import secure_filename
 
 from clues import ScenarioAgent
 from actions import ActionsAgent
-from agent import Agent
+from agent import Agent, Prefetcher
+from traces import TraceRecorder
 
 app = Flask(__name__)
 
@@ -21,6 +23,19 @@ WhisperAgent = None
 DiscoverAgent = None
 HintAgent = None
 
+# Generates default hints in the background while the model is otherwise idle
+IdlePrefetcher = Prefetcher(trace_route="hint-prefetch")
+
+DEFAULT_HINT_QUESTION = "Explain {action_name} simply and how it could impact me"
+
+# Opt-in trace log of every generation, for offline replay with `python -m traces.replay`
+TRACE_FILE = os.environ.get("TRACE_FILE")
+Recorder = TraceRecorder(TRACE_FILE) if TRACE_FILE else None
+IdlePrefetcher.recorder = Recorder
+
+def traced(route):
+    return Recorder.request(route) if Recorder else nullcontext()
+
 def load_instruct_agent():
     global InstructAgent, WhisperAgent
 
@@ -32,6 +47,7 @@ def load_instruct_agent():
             torch.cuda.empty_cache()
 
         InstructAgent = Agent()
+        InstructAgent.recorder = Recorder
 
 def load_whisper_agent():
     global WhisperAgent, InstructAgent
@@ -43,6 +59,9 @@ def load_whisper_agent():
 
             torch.cuda.empty_cache()
 
+        # The instruct model is being unloaded, so pending prefetches can no longer run
+        IdlePrefetcher.cancel()
+
         WhisperAgent = whisper.load_model("base")
 
 def load_hint_agent(data):
@@ -52,6 +71,7 @@ def load_hint_agent(data):
         if not HintAgent.agent:
             load_instruct_agent()
             HintAgent.set_root_agent(InstructAgent)
+            prefetch_hints()
         return
 
     load_instruct_agent()
@@ -62,9 +82,21 @@ def load_hint_agent(data):
         raise Exception("No actions from which to gather context for hints")
 
     HintAgent = ActionsAgent(InstructAgent, actions)
+    prefetch_hints()
 
     return jsonify({'message': 'Hint Agent loaded successfully'}), 200
 
+def prefetch_hints():
+    """Speculatively generate the default explanation for every action of the loaded quest."""
+    hint_agent = HintAgent
+
+    for action_name in hint_agent.action_names():
+        question = DEFAULT_HINT_QUESTION.format(action_name=action_name)
+
+        def job(stopping_criteria, action_name=action_name, question=question):
+            return hint_agent.generate_response(action_name, question, stopping_criteria)
+
+        IdlePrefetcher.schedule((action_name, question), job)
 
 
 
@@ -121,14 +153,23 @@ def hint():
     global HintAgent
 
     data = request.json
-    load_hint_agent(data)
 
     action_name = data.get('action_name')
     question = data.get('question')
     if not question:
-        question = f"Explain {action_name} simply and how it could impact me"
+        question = DEFAULT_HINT_QUESTION.format(action_name=action_name)
+
+    with traced("hint"):
+        # A prefetched answer needs no model time, so serve it without preempting the background work
+        response = IdlePrefetcher.take((action_name, question)) if HintAgent else None
 
-    response = HintAgent.process_question(action_name, question)
+        if response is None:
+            with IdlePrefetcher.interactive():
+                load_hint_agent(data)
+
+                response = IdlePrefetcher.take((action_name, question))
+                if response is None:
+                    response = HintAgent.process_question(action_name, question)
 
     return jsonify({'response': response}), 200
 
@@ -138,11 +179,13 @@ def discover():
     global DiscoverAgent
 
     data = request.json
-    load_discover_agent(data)
 
     question = data.get('question')
 
-    response, discoveries = DiscoverAgent.process_question(question)
+    with traced("discover"), IdlePrefetcher.interactive():
+        load_discover_agent(data)
+
+        response, discoveries = DiscoverAgent.process_question(question)
 
     return jsonify({'response': response, 'discoveries': discoveries}), 200
 
@@ -151,7 +194,8 @@ def discover():
 def transcribe_discover_audio():
     global DiscoverAgent, WhisperAgent
 
-    load_whisper_agent()
+    with IdlePrefetcher.interactive():
+        load_whisper_agent()
 
     if 'audio' not in request.files:
         return jsonify({'error': 'No audio file provided'}), 400
@@ -166,12 +210,13 @@ def transcribe_discover_audio():
         temp_filepath = temp.name
 
     try:
-        result = WhisperAgent.transcribe(temp_filepath)
-        transcription = result.get("text", "")
+        with traced("transcribe-discover"), IdlePrefetcher.interactive():
+            result = WhisperAgent.transcribe(temp_filepath)
+            transcription = result.get("text", "")
 
-        load_discover_agent(None)
+            load_discover_agent(None)
 
-        response, discoveries = DiscoverAgent.process_question(transcription)
+            response, discoveries = DiscoverAgent.process_question(transcription)
 
         print("Transcription:", transcription)
         os.remove(temp_filepath)
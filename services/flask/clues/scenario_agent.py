@@ -151,24 +151,11 @@ INSTRUCTIONS:
         try:
             # Create a standalone query to the model
             analysis_messages = [{"role": "user", "content": analysis_prompt}]
-            inputs = self.agent.tokenizer.apply_chat_template(
+            analysis_response = self.agent.generate(
                 analysis_messages,
-                add_generation_prompt=True,
-                return_tensors="pt"
+                max_new_tokens=512,
+                temperature=0.1,  # Low temperature for more deterministic output
             )
-            # Move inputs to the appropriate device
-            if hasattr(self.agent.model, 'device'):
-                inputs = inputs.to(self.agent.model.device)
-            else:
-                first_param = next(self.agent.model.parameters())
-                inputs = inputs.to(first_param.device)
-            with torch.no_grad():
-                outputs = self.agent.model.generate(
-                    inputs,
-                    max_new_tokens=512,
-                    temperature=0.1,  # Low temperature for more deterministic output
-                )
-            analysis_response = self.agent.tokenizer.decode(outputs[0][inputs.shape[1]:], skip_special_tokens=True)
             return analysis_response
         except Exception as e:
             print(f"Error during relatedness analysis: {e}")
@@ -197,31 +184,15 @@ INSTRUCTIONS:
             messages = [messages[0]] + messages[-9:]
 
         try:
-            inputs = self.agent.tokenizer.apply_chat_template(
+            # Use more conservative generation settings
+            response = self.agent.generate(
                 messages,
-                add_generation_prompt=True,
-                return_tensors="pt"
+                max_new_tokens=256,  # Reduced from 512 to save memory
+                temperature=0.7,
+                top_p=0.9,
+                do_sample=True,
             )
 
-            # Move inputs to the appropriate device
-            if hasattr(self.agent.model, 'device'):
-                inputs = inputs.to(self.agent.model.device)
-            else:
-                # If model is distributed across devices, use the first parameter's device
-                first_param = next(self.agent.model.parameters())
-                inputs = inputs.to(first_param.device)
-
-            with torch.no_grad():
-                # Use more conservative generation settings
-                outputs = self.agent.model.generate(
-                    inputs,
-                    max_new_tokens=256,  # Reduced from 512 to save memory
-                    temperature=0.7,
-                    top_p=0.9,
-                    do_sample=True,
-                )
-
-            response = self.agent.tokenizer.decode(outputs[0][inputs.shape[1]:], skip_special_tokens=True)
             if "{" in response:
                 try:
                     agent_isolated_json = response.split('{', 2)[1].split('}', 2)[0]
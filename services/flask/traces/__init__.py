@@ -0,0 +1 @@
+from .recorder import TraceRecorder, load_traces
\ No newline at end of file
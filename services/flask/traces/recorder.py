@@ -0,0 +1,128 @@
+import atexit
+import gzip
+import json
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List
+
+
+def _open_trace_file(path: str, mode: str):
+    """Open a trace log, transparently gzipped when the path ends in .gz."""
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+
+    return open(path, mode, encoding="utf-8")
+
+
+def _serializable_params(generate_kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """Keep only the generation settings that can be written to the log and replayed."""
+    return {k: v for k, v in generate_kwargs.items() if isinstance(v, (bool, int, float, str))}
+
+
+def load_traces(path: str) -> List[Dict[str, Any]]:
+    """
+    Read every request trace from a log written by TraceRecorder.
+
+    A gzipped log that is still being written (or whose writer was killed) has no
+    gzip trailer yet; every line flushed before that point is still returned.
+    """
+    traces = []
+
+    with _open_trace_file(path, "r") as f:
+        try:
+            for line in f:
+                if line.strip():
+                    traces.append(json.loads(line))
+        except (EOFError, zlib.error):
+            print(f"Trace log {path} ends in an unfinished gzip stream, read {len(traces)} traces")
+
+    return traces
+
+
+class TraceRecorder:
+    """
+    Appends one compact JSON line per request to a trace log.
+
+    The log is kept open for the recorder's lifetime and flushed after every line,
+    so a .gz log compresses as a single stream rather than line by line.
+
+    Each line holds the route, the total request time and every model generation
+    made while serving it: the rendered chat messages, the generation settings,
+    the prompt and completion token counts and the time spent in each stage.
+    Generations made outside of `request()` are logged as requests of their own
+    with route None.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+        self.file = None
+
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+        atexit.register(self.close)
+
+    @contextmanager
+    def request(self, route: str) -> Iterator[Dict[str, Any]]:
+        """Collect the generations made by the current thread into a single trace."""
+        trace = {"route": route, "timestamp": time.time(), "generations": []}
+        self.local.trace = trace
+
+        started = time.perf_counter()
+        try:
+            yield trace
+        finally:
+            trace["total_ms"] = (time.perf_counter() - started) * 1000
+            self.local.trace = None
+
+            if not trace.pop("discarded", False):
+                self._write(trace)
+
+    def discard(self) -> None:
+        """Drop the trace the current thread is collecting instead of writing it."""
+        trace = getattr(self.local, "trace", None)
+        if trace is not None:
+            trace["discarded"] = True
+
+    def record_generation(self, messages: List[Dict[str, str]], generate_kwargs: Dict[str, Any], input_tokens: int,
+                          output_tokens: int, timings: Dict[str, float]) -> None:
+        """Called by Agent.generate after every generation."""
+        generation = {
+            "messages": [dict(message) for message in messages],
+            "params": _serializable_params(generate_kwargs),
+            "input_tokens": int(input_tokens),
+            "output_tokens": int(output_tokens),
+            "timings": {k: round(v, 3) for k, v in timings.items()},
+        }
+
+        trace = getattr(self.local, "trace", None)
+        if trace is not None:
+            trace["generations"].append(generation)
+            return
+
+        self._write({
+            "route": None,
+            "timestamp": time.time(),
+            "generations": [generation],
+            "total_ms": sum(timings.values()),
+        })
+
+    def _write(self, trace: Dict[str, Any]) -> None:
+        line = json.dumps(trace, ensure_ascii=False, separators=(",", ":"))
+
+        with self.lock:
+            if self.file is None:
+                self.file = _open_trace_file(self.path, "a")
+
+            self.file.write(line + "\n")
+            self.file.flush()
+
+    def close(self) -> None:
+        """Close the log, writing the gzip trailer for .gz logs."""
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
@@ -0,0 +1,228 @@
+"""
+Replay recorded request traces against an Agent and compare timings with the recording.
+
+Run from services/flask:
+
+    python -m traces.replay traces.jsonl --output replay.jsonl
+    python -m traces.replay traces.jsonl --output replay.jsonl --model-id <hf model> --set max_new_tokens=128
+    python -m traces.replay traces.jsonl --output replay.jsonl --backend my_backend:FastAgent --profile-dir profiles/
+    python -m traces.replay baseline.jsonl --compare candidate.jsonl
+
+Prefetched hints are logged as requests to "hint-prefetch", and the /hint clicks they
+serve as "hint" requests without generations. Both are replayed and counted unless
+`--route` selects other routes.
+
+A backend is any class that can be built with an optional model_id, exposes a
+`recorder` attribute and implements `generate(messages, **generate_kwargs)` like Agent.
+"""
+import argparse
+import importlib
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+import torch
+
+from .recorder import TraceRecorder, load_traces
+
+
+def _percentile(values: List[float], percentile: float) -> float:
+    if not values:
+        return 0.0
+
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(percentile / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _model_ms(trace: Dict[str, Any]) -> float:
+    """Time spent in the model for a request, excluding route overhead such as agent loading."""
+    return sum(sum(g["timings"].values()) for g in trace["generations"])
+
+
+def select_routes(traces: List[Dict[str, Any]], routes: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """Keep the traces of the given routes, or every trace when no routes are given."""
+    if routes:
+        return [trace for trace in traces if str(trace["route"]) in routes]
+
+    return traces
+
+
+def summarize(traces: List[Dict[str, Any]]) -> Dict[str, float]:
+    """
+    Aggregate latency and throughput figures for a list of request traces.
+
+    Requests served without a generation (e.g. from the hint prefetch cache) count
+    as requests with no model time.
+    """
+    generations = [g for trace in traces for g in trace["generations"]]
+
+    latencies = [_model_ms(trace) for trace in traces]
+    output_tokens = sum(g["output_tokens"] for g in generations)
+    generate_ms = sum(g["timings"]["generate_ms"] for g in generations)
+
+    summary = {
+        "requests": len(traces),
+        "requests_without_generation": sum(1 for trace in traces if not trace["generations"]),
+        "generations": len(generations),
+        "input_tokens": sum(g["input_tokens"] for g in generations),
+        "output_tokens": output_tokens,
+        "latency_mean_ms": sum(latencies) / len(latencies) if latencies else 0.0,
+        "latency_p50_ms": _percentile(latencies, 50),
+        "latency_p95_ms": _percentile(latencies, 95),
+        "template_ms": sum(g["timings"]["template_ms"] for g in generations),
+        "generate_ms": generate_ms,
+        "decode_ms": sum(g["timings"]["decode_ms"] for g in generations),
+        "tokens_per_second": output_tokens / (generate_ms / 1000) if generate_ms else 0.0,
+    }
+
+    for route in sorted({str(trace["route"]) for trace in traces}):
+        route_latencies = [_model_ms(trace) for trace in traces if str(trace["route"]) == route]
+        summary[f"{route}_latency_p50_ms"] = _percentile(route_latencies, 50)
+
+    return summary
+
+
+def compare(baseline: List[Dict[str, Any]], candidate: List[Dict[str, Any]]) -> str:
+    """Render a table of baseline vs candidate figures with the relative change."""
+    baseline_summary = summarize(baseline)
+    candidate_summary = summarize(candidate)
+
+    rows = [("metric", "baseline", "candidate", "change")]
+    for metric in baseline_summary:
+        before = baseline_summary[metric]
+        after = candidate_summary.get(metric, 0.0)
+        change = f"{(after - before) / before * 100:+.1f}%" if before else "n/a"
+        rows.append((metric, f"{before:.1f}", f"{after:.1f}", change))
+
+    widths = [max(len(row[i]) for row in rows) for i in range(4)]
+    return "\n".join(
+        "  ".join(cell.ljust(widths[i]) if i == 0 else cell.rjust(widths[i]) for i, cell in enumerate(row))
+        for row in rows
+    )
+
+
+def _replay_request(agent, trace: Dict[str, Any], overrides: Dict[str, Any], match_lengths: bool) -> None:
+    for generation in trace["generations"]:
+        params = {**generation["params"], **overrides}
+
+        if match_lengths:
+            params["max_new_tokens"] = params["min_new_tokens"] = max(1, generation["output_tokens"])
+
+        agent.generate(generation["messages"], **params)
+
+
+def replay(traces: List[Dict[str, Any]], agent, recorder: TraceRecorder, overrides: Dict[str, Any] = None,
+           match_lengths: bool = False) -> None:
+    """
+    Run every recorded generation against `agent`, logging the new timings to `recorder`.
+
+    Args:
+        traces: Request traces to replay, in order
+        agent: Agent (or compatible backend) to generate with
+        recorder: Recorder the replayed requests are written to
+        overrides: Generation settings that replace the recorded ones
+        match_lengths: Force every completion to the recorded number of tokens, so that
+            sampling differences do not skew the comparison
+    """
+    overrides = overrides or {}
+    agent.recorder = recorder
+
+    for i, trace in enumerate(traces):
+        with recorder.request(trace["route"]):
+            _replay_request(agent, trace, overrides, match_lengths)
+
+        print(f"Replayed request {i + 1}/{len(traces)} ({trace['route']})")
+
+
+def profile(traces: List[Dict[str, Any]], agent, profile_dir: str, overrides: Dict[str, Any] = None,
+            match_lengths: bool = False) -> None:
+    """
+    Replay every request again under the torch profiler, writing one chrome trace per request.
+
+    This pass is not recorded, so profiler overhead does not leak into the timing comparison.
+    """
+    overrides = overrides or {}
+    agent.recorder = None
+
+    os.makedirs(profile_dir, exist_ok=True)
+
+    activities = [torch.profiler.ProfilerActivity.CPU]
+    if torch.cuda.is_available():
+        activities.append(torch.profiler.ProfilerActivity.CUDA)
+
+    for i, trace in enumerate(traces):
+        with torch.profiler.profile(activities=activities, record_shapes=True) as profiler:
+            _replay_request(agent, trace, overrides, match_lengths)
+
+        profiler.export_chrome_trace(os.path.join(profile_dir, f"{i:05d}-{trace['route']}.json"))
+
+        print(f"Profiled request {i + 1}/{len(traces)} ({trace['route']})")
+
+
+def _parse_override(value: str):
+    key, _, raw = value.partition("=")
+
+    try:
+        return key, json.loads(raw)
+    except json.JSONDecodeError:
+        return key, raw
+
+
+def _load_backend(path: str):
+    module_name, _, attr = path.partition(":")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded request traces and compare performance.")
+    parser.add_argument("traces", help="Trace log recorded by the app (TRACE_FILE)")
+    parser.add_argument("--compare", metavar="TRACES", help="Only compare the given trace log against TRACES")
+    parser.add_argument("--output", help="Where to write the replayed traces")
+    parser.add_argument("--backend", default="agent:Agent", help="Agent class to replay against, as module:Class")
+    parser.add_argument("--model-id", help="Model to load in the backend")
+    parser.add_argument("--set", dest="overrides", action="append", default=[], metavar="KEY=VALUE",
+                        help="Override a recorded generation setting, e.g. --set max_new_tokens=128")
+    parser.add_argument("--route", dest="routes", action="append",
+                        help="Only replay requests to this route (repeatable), e.g. hint, hint-prefetch or discover")
+    parser.add_argument("--match-lengths", action="store_true",
+                        help="Generate exactly the recorded number of tokens per completion")
+    parser.add_argument("--warmup", type=int, default=1, help="Requests to run untimed before replaying")
+    parser.add_argument("--profile-dir",
+                        help="After the timed replay, profile every request in a separate pass and "
+                             "write one torch profiler trace per request into this directory")
+    args = parser.parse_args()
+
+    traces = select_routes(load_traces(args.traces), args.routes)
+
+    if args.compare:
+        print(compare(traces, select_routes(load_traces(args.compare), args.routes)))
+        return
+
+    if not args.output:
+        parser.error("--output is required when replaying")
+
+    backend = _load_backend(args.backend)
+    agent = backend(model_id=args.model_id) if args.model_id else backend()
+    overrides = dict(_parse_override(value) for value in args.overrides)
+
+    # Warm up kernels and allocator so the first replayed request is not an outlier
+    for trace in traces[:args.warmup]:
+        _replay_request(agent, trace, overrides, args.match_lengths)
+
+    # The recorder appends, so start from an empty log
+    if os.path.exists(args.output):
+        os.remove(args.output)
+
+    recorder = TraceRecorder(args.output)
+    replay(traces, agent, recorder, overrides, args.match_lengths)
+    recorder.close()
+
+    print(compare(traces, load_traces(args.output)))
+
+    if args.profile_dir:
+        profile(traces, agent, args.profile_dir, overrides, args.match_lengths)
+
+
+if __name__ == "__main__":
+    main()